@@ -2,18 +2,24 @@ import streamlit as st
 from pathlib import Path
 import os
 from dotenv import load_dotenv
-from PyPDF2 import PdfReader
-import io
 import sys
+import io
+import hashlib
+import datetime
+from functools import partial
+import logging
+from typing import List, Optional, Tuple
 
 from shacl_generator.examples import ExampleStore
-from shacl_generator.generator import ShaclGenerator, GeneratorContext
-from shacl_generator.datafields import DataFieldRegistry
+from shacl_generator.generator import ShaclGenerator, GeneratorContext, turtle_of
+from shacl_generator.datafields import DataFieldRegistry, DataField
+from shacl_generator.debug_output import DebugOutputHandler, capture_debug_output
 from shacl_generator.instances import InstanceStore
 from shacl_generator.llm import SHACL_GENERATION_SYSTEM_PROMPT, RULE_EXTRACTION_SYSTEM_PROMPT
 from shacl_generator.shapes import ShapeStore
+from shacl_generator.tokens import count_tokens, get_encoding
 
-import tiktoken
+from rdflib import Graph
 
 # Set page config first
 st.set_page_config(
@@ -36,43 +42,79 @@ if not os.getenv("OPENAI_API_KEY"):
     st.error("OpenAI API key not found. Please set the OPENAI_API_KEY environment variable.")
     st.stop()
 
+# Text uploads larger than this are truncated instead of decoded in full,
+# Turtle uploads larger than this are rejected
+MAX_UPLOAD_BYTES = 8 * 1024 * 1024
+# Number of items shown per page in Manage Feedback and Manage Examples
+FEEDBACK_PAGE_SIZE = 20
+EXAMPLES_PAGE_SIZE = 10
+
+def read_text_upload(uploaded_file) -> str:
+    """Read an uploaded text file as UTF-8, capped at MAX_UPLOAD_BYTES."""
+    if uploaded_file.size > MAX_UPLOAD_BYTES:
+        st.warning(f"{uploaded_file.name} is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB, only the beginning is used.")
+    # Decode straight from the upload's buffer instead of copying it out with read() first
+    with uploaded_file.getbuffer() as buffer:
+        return str(buffer[:MAX_UPLOAD_BYTES], "utf-8", "replace")
+
+def read_turtle_upload(uploaded_file) -> Optional[str]:
+    """Read an uploaded Turtle file as UTF-8, or None if it exceeds MAX_UPLOAD_BYTES.
+    Unlike legal text, a truncated Turtle file would not parse, so it is rejected."""
+    if uploaded_file.size > MAX_UPLOAD_BYTES:
+        st.error(f"{uploaded_file.name} is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB and cannot be used.")
+        return None
+    with uploaded_file.getbuffer() as buffer:
+        return str(buffer, "utf-8", "replace")
+
 def extract_text_from_pdf(pdf_file) -> str:
     """Extract text from a PDF file."""
-    pdf_reader = PdfReader(io.BytesIO(pdf_file.read()))
-    text = []
-    for page in pdf_reader.pages:
-        text.append(page.extract_text())
-    return "\n".join(text)
+    return extract_text_from_pdf_bytes(pdf_file.getvalue())
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def extract_text_from_pdf_bytes(data: bytes) -> str:
+    """Extract text from PDF content, keyed on the bytes so reruns don't parse the same upload again."""
+    # Imported here so sessions that never upload a PDF don't pay for loading PyPDF2
+    from PyPDF2 import PdfReader
+    # BytesIO shares the bytes object instead of copying it
+    pdf_reader = PdfReader(io.BytesIO(data))
+    # Image-only pages have no text layer and may yield None
+    return "\n".join(page.extract_text() or "" for page in pdf_reader.pages)
 
 def truncate_text(text: str, max_length: int = 30000) -> str:
     """Truncate text to max_length while preserving paragraph structure."""
     if len(text) <= max_length:
         return text
     
-    # Find the last paragraph break before max_length
+    # Cut at the last paragraph break before max_length, falling back to
+    # line breaks and then sentence ends
     truncated = text[:max_length]
-    last_break = truncated.rfind('\n\n')
-    if (last_break == -1):
-        last_break = truncated.rfind('\n')
-    if (last_break == -1):
-        last_break = truncated.rfind('. ')
-    
-    if (last_break != -1):
-        truncated = truncated[:last_break]
-    
+    for separator in ('\n\n', '\n', '. '):
+        head, found, _ = truncated.rpartition(separator)
+        if found:
+            truncated = head
+            break
+
     return truncated + "\n\n[Text truncated due to length...]"
 
-def count_tokens(text: str) -> int:
-    """Count the number of tokens in a text using GPT tokenizer."""
-    encoding = tiktoken.get_encoding("cl100k_base")  # GPT-4 encoding
-    return len(encoding.encode(text))
+@st.cache_data(max_entries=8, show_spinner=False)
+def count_tokens_batch(texts: Tuple[str, ...]) -> List[int]:
+    """Count the tokens of several texts at once, encoding them in parallel."""
+    encoded = get_encoding().encode_ordinary_batch(list(texts), num_threads=os.cpu_count() or 1)
+    return [len(tokens) for tokens in encoded]
 
-# Create custom print function
-def custom_print(*args):
-    """Custom print function that stores output in debug_output list and prints to console."""
-    message = " ".join(map(str, args))
-    debug_output.append(message)
-    old_print(*args)  # Still print to console
+def text_id_of(text: str) -> str:
+    """Stable id for a text. Unlike hash(), it is the same across app restarts."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+@st.cache_resource
+def setup_logging() -> None:
+    """Attach the handlers once per process, not once per rerun."""
+    logger = logging.getLogger("shacl_generator")
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(DebugOutputHandler())
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.INFO)  # Still print to console
+    logger.addHandler(console_handler)
 
 # Initialize components
 @st.cache_resource
@@ -91,18 +133,90 @@ def init_components():
     generator = ShaclGenerator(context, example_store=example_store, field_registry=field_registry)
     return example_store, generator, field_registry, instance_store, shape_store
 
+setup_logging()
 example_store, generator, field_registry, instance_store, shape_store = init_components()
 
+# LLM calls are memoized on their inputs, so clicking a generate button again
+# with unchanged text does not pay for another completion. Graphs are cached
+# as Turtle and parsed again by the caller. Shapes generated from legal text
+# are not memoized here, the shape store already keeps them across restarts.
+@st.cache_data(max_entries=64, show_spinner=False)
+def cached_generate_rules(legal_text: str) -> str:
+    return generator.generate_rules(legal_text)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def cached_deploy_second_agent(shape_text: str) -> Tuple[str, List[DataField]]:
+    improved_shape, new_fields = generator.deploy_second_agent(shape_text)
+    return improved_shape.serialize(format='turtle'), new_fields
+
+
+# Input widget for each field datatype in the Create New Instance form,
+# fields with another datatype get a text input
+DATATYPE_WIDGETS = {
+    'xsd:string': st.text_input,
+    'xsd:integer': partial(st.number_input, step=1),
+    'xsd:decimal': st.number_input,
+    'xsd:boolean': st.checkbox,
+    'xsd:date': partial(
+        st.date_input,
+        min_value=datetime.date(1900, 1, 1),  # Allow dates from 1900
+        max_value=datetime.date.today()  # Up to today
+    ),
+}
+
+def page_bounds(item_count: int, page_size: int, key: str) -> Tuple[int, int]:
+    """Show a page selector when the items don't fit on one page, return the slice bounds of the chosen page."""
+    page_count = max(1, (item_count - 1) // page_size + 1)
+    page = st.number_input("Page", min_value=1, max_value=page_count, value=1, key=key) if page_count > 1 else 1
+    first = (page - 1) * page_size
+    return first, first + page_size
+
+# Delete buttons run these as callbacks. Callbacks run before the rerun
+# triggered by the click, so the lists are rendered once, already without
+# the deleted item, instead of a second time via st.rerun()
+def delete_shape(shape_id: str) -> None:
+    shape_store.delete_shape(shape_id)
+    st.toast(f"Shape {shape_id} deleted!")
+
+def delete_example(index: int) -> None:
+    example_store.delete_example(index)
+    st.toast(f"Example {index+1} deleted!")
+
+def delete_guideline(index: int) -> None:
+    generator.context.remove_guideline(index)
+    generator.context.save(CONTEXT_PATH)
+    st.toast(f"Guideline {index+1} deleted!")
+
+def delete_instance(instance_id: str) -> None:
+    try:
+        instance_store.delete_instance(instance_id)
+        st.toast(f"Instance {instance_id} deleted!")
+    except ValueError as e:
+        st.toast(str(e))
+
+def delete_feedback(index: int) -> None:
+    generator.context.remove_feedback(index)
+    generator.context.save(CONTEXT_PATH)
+    st.toast(f"Feedback {index+1} deleted!")
+
 
 # initialise state
-if 'raw_rules_text' not in st.session_state:
-    st.session_state.raw_rules_text = ""
-    
-if 'shacl_input_text' not in st.session_state:
-    st.session_state.shacl_input_text = ""
-    
-if 'logic_input_shape' not in st.session_state:
-    st.session_state.logic_input_shape = ""    
+SESSION_DEFAULTS = {
+    'raw_rules_text': "",
+    'shacl_input_text': "",
+    'logic_input_shape': "",
+    # Results of the generation journey, None until generated
+    'current_rules': None,
+    'current_rules_prompt': None,
+    'current_shape': None,
+    'current_prompt': None,
+    'current_text_id': None,
+    'current_logic_shape': None,
+    'current_logic_text_id': None,
+    'debug_output': None,
+}
+for key, value in SESSION_DEFAULTS.items():
+    st.session_state.setdefault(key, value)
     
 
 st.title("Legal Text to SHACL Shape Mapper")
@@ -117,6 +231,106 @@ with st.sidebar:
     )
     
     
+# The text inputs of the generation journey run as fragments, so editing the
+# text or uploading a file only reruns the input panel and its token count
+# instead of the whole page.
+def show_token_count(text: str) -> None:
+    if text:
+        st.write(f"Token count: **{count_tokens(text):,}**")
+
+@st.fragment
+def rules_text_input() -> str:
+    # Add file upload option
+    uploaded_raw_file = st.file_uploader("Upload PDF or paste text", type=['pdf', 'txt'], key="rules_raw_file")
+    if uploaded_raw_file is not None:
+        try:
+            if uploaded_raw_file.type == "application/pdf":
+                raw_rules_text = extract_text_from_pdf(uploaded_raw_file)
+            else:  # txt file
+                raw_rules_text = read_text_upload(uploaded_raw_file)
+            
+            # Show extracted text with option to edit
+            raw_rules_text = st.text_area(
+                "Review and edit extracted text if needed",
+                value=raw_rules_text,
+                height=300,
+                key="rules_text_area"  # Changed key                    
+            )
+        except Exception as e:
+            st.error(f"Error processing file: {str(e)}")
+            raw_rules_text = ""
+    else:
+        raw_rules_text = st.text_area(
+            "Or paste legal text directly",
+            height=300,
+            key="rules_text_area"  # Changed key
+        )
+
+    show_token_count(raw_rules_text)
+    return raw_rules_text
+
+@st.fragment
+def shacl_text_input() -> str:
+    # Add file upload option
+    uploaded_file = st.file_uploader("Upload PDF or paste text", type=['pdf', 'txt'], key="shacl_raw_file")
+    
+    if uploaded_file is not None:
+        try:
+            if uploaded_file.type == "application/pdf":
+                legal_text = extract_text_from_pdf(uploaded_file)
+            else:  # txt file
+                legal_text = read_text_upload(uploaded_file)
+            
+            # Show extracted text with option to edit
+            legal_text = st.text_area(
+                "Review and edit extracted text if needed",
+                value=legal_text,
+                height=300,
+                key="shacl_text_area"  # Changed key
+            )
+        except Exception as e:
+            st.error(f"Error processing file: {str(e)}")
+            legal_text = ""
+            
+    elif len(st.session_state['shacl_input_text']) > 0:
+        legal_text = st.text_area(
+            "Or paste legal text directly",
+            value=st.session_state['shacl_input_text'],
+            height=300,
+            key="uploaded_shacl_area"  # Added unique key
+        )
+                
+    else:
+        legal_text = st.text_area(
+            "Or paste legal text directly",
+            height=300,
+            key="shacl_text_area"  # Changed key                
+        )
+
+    show_token_count(legal_text)
+    return legal_text
+
+@st.fragment
+def logic_text_input() -> str:
+    if len(st.session_state['logic_input_shape']) > 0:
+        logic_text = st.text_area(
+            "Input shape", 
+            value=st.session_state['logic_input_shape'],
+            height=300,
+            key="logic_agent_input"  # Added unique key
+        )
+                
+    else:
+        logic_text = st.text_area(
+            "Or paste shacl shape directly",
+            height=300,
+            key="logic_agent_input"  # Changed key                
+        )
+
+    show_token_count(logic_text)
+    return logic_text
+
+
 if mode == "Generation Journey":
     tab1, tab2, tab3 = st.tabs([
         "Rules extraction", 
@@ -127,86 +341,42 @@ if mode == "Generation Journey":
     with tab1:        
         st.header("Legal Text Input")
         
-        # Add file upload option
-        uploaded_raw_file = st.file_uploader("Upload PDF or paste text", type=['pdf', 'txt'], key="rules_raw_file")
-        if uploaded_raw_file is not None:
-            try:
-                if uploaded_raw_file.type == "application/pdf":
-                    raw_rules_text = extract_text_from_pdf(uploaded_raw_file)
-                else:  # txt file
-                    raw_rules_text = uploaded_raw_file.read().decode()
-                
-                # Show extracted text with option to edit
-                raw_rules_text = st.text_area(
-                    "Review and edit extracted text if needed",
-                    value=raw_rules_text,
-                    height=300,
-                    key="rules_text_area"  # Changed key                    
-                )
-            except Exception as e:
-                st.error(f"Error processing file: {str(e)}")
-                raw_rules_text = ""
-        else:
-            raw_rules_text = st.text_area(
-                "Or paste legal text directly",
-                height=300,
-                key="rules_text_area"  # Changed key
-            )
-        
-        # Display token count and generate button side by side
-        col_tokens, col_button = st.columns([3,1])
-        
-        
-        with col_tokens:
-            if raw_rules_text:
-                token_count = count_tokens(raw_rules_text)
-                st.write(f"Token count: **{token_count:,}**")
-        
-        with col_button:
-            generate_rules_button = st.button("Generate rules")
+        raw_rules_text = rules_text_input()
+        force_rules = st.checkbox("Force regenerate", key="force_rules")
+        generate_rules_button = st.button("Generate rules")
             
         if generate_rules_button:
             if raw_rules_text:
-                with st.spinner("Generating rules..."):
-                    # Only create output list, remove debug container
-                    debug_output = []
+                with st.spinner("Generating rules..."), capture_debug_output() as debug_output:
+                    # Generate unique ID for the text
+                    text_id = text_id_of(raw_rules_text)
                     
-                    # Store original print and replace it
-                    old_print = print
-                    import builtins
-                    builtins.print = custom_print
+                    # Get the prompts
+                    rules_prompt = generator.llm._create_rules_generation_prompt(
+                        legal_text=raw_rules_text
+                    )
                     
-                    try:
-                        # Generate unique ID for the text
-                        text_id = str(hash(raw_rules_text))
-                        
-                        # Get the prompts
-                        rules_prompt = generator.llm._create_rules_generation_prompt(
-                            legal_text=raw_rules_text
-                        )
-                        
-                        # Store prompts in session state
-                        st.session_state['current_rules_prompt'] = rules_prompt
-                        
-                        # Generate rules
-                        rules = generator.generate_rules(raw_rules_text)
-                        
-                        st.session_state['current_rules'] = rules
-                        st.session_state['current_text_id'] = text_id
-                        
-                        # Store debug output
-                        st.session_state['debug_output'] = "\n".join(debug_output)                
-                        
-                        st.success("Rules generated!")
-                    finally:
-                        # Restore original print function
-                        builtins.print = old_print
+                    # Store prompts in session state
+                    st.session_state['current_rules_prompt'] = rules_prompt
+                    
+                    # Generate rules
+                    if force_rules:
+                        cached_generate_rules.clear(raw_rules_text)
+                    rules = cached_generate_rules(raw_rules_text)
+                    
+                    st.session_state['current_rules'] = rules
+                    st.session_state['current_text_id'] = text_id
+                    
+                    # Store debug output
+                    st.session_state['debug_output'] = "\n".join(debug_output)                
+                    
+                    st.success("Rules generated!")
             else:
                 st.warning("Please provide some legal text first.")   
                 
         st.header("Extracted rules")
         
-        if 'current_rules' in st.session_state:
+        if st.session_state['current_rules'] is not None:
             # Add tabs for shape, prompts, validation, and debug
             rules_tab1, rules_tab2, rules_tab3, rules_tab4 = st.tabs([
                 "Rules", 
@@ -233,7 +403,7 @@ if mode == "Generation Journey":
                             height=500)
             
             with rules_tab4:
-                if 'debug_output' in st.session_state:
+                if st.session_state['debug_output'] is not None:
                     st.text('here is the debug output')                    
                     st.text(st.session_state['debug_output'])                    
           
@@ -241,84 +411,37 @@ if mode == "Generation Journey":
     with tab2:
         st.header("Legal Text Input")
     
-        # Add file upload option
-        uploaded_file = st.file_uploader("Upload PDF or paste text", type=['pdf', 'txt'], key="shacl_raw_file")
-        
-        if uploaded_file is not None:
-            try:
-                if uploaded_file.type == "application/pdf":
-                    legal_text = extract_text_from_pdf(uploaded_file)
-                else:  # txt file
-                    legal_text = uploaded_file.read().decode()
-                
-                # Show extracted text with option to edit
-                legal_text = st.text_area(
-                    "Review and edit extracted text if needed",
-                    value=legal_text,
-                    height=300,
-                    key="shacl_text_area"  # Changed key
-                )
-            except Exception as e:
-                st.error(f"Error processing file: {str(e)}")
-                legal_text = ""
-                
-        elif len(st.session_state['shacl_input_text']) > 0:
-            legal_text = st.text_area(
-                "Or paste legal text directly",
-                value=st.session_state['shacl_input_text'],
-                height=300,
-                key="uploaded_shacl_area"  # Added unique key
-            )
-                    
-        else:
-            legal_text = st.text_area(
-                "Or paste legal text directly",
-                height=300,
-                key="shacl_text_area"  # Changed key                
-            )
-        
-        # Display token count and generate button side by side
-        col_tokens, col_button = st.columns([3,1])
-        
-        # Create debug container before handling button
-        debug_output = []
-        
-        with col_tokens:
-            if legal_text:
-                token_count = count_tokens(legal_text)
-                st.write(f"Token count: **{token_count:,}**")
-        
-        with col_button:
-            generate_shacl_button = st.button("Generate Shape")        
+        legal_text = shacl_text_input()
+        force_shacl = st.checkbox("Force regenerate", key="force_shacl")
+        generate_shacl_button = st.button("Generate Shape")
             
         if generate_shacl_button:
             if legal_text:
-                with st.spinner("Generating SHACL shape..."):
-                    # Only create output list, remove debug container
-                    debug_output = []
+                with st.spinner("Generating SHACL shape..."), capture_debug_output() as debug_output:
+                    # Generate unique ID for the text
+                    text_id = text_id_of(legal_text)
                     
-                    # Store original print and replace it
-                    old_print = print
-                    import builtins
-                    builtins.print = custom_print
+                    # Get the prompts
+                    shacl_prompt = generator.create_generation_prompt(legal_text, text_id)
                     
-                    try:
-                        # Generate unique ID for the text
-                        text_id = str(hash(legal_text))
-                        
-                        # Get the prompts
-                        shacl_prompt = generator.llm._create_generation_prompt(
-                            legal_text=legal_text,
-                            examples=generator._get_relevant_examples(text_id),
-                            feedback_history=generator._get_relevant_feedback(text_id),
-                            guidelines=generator.context.general_guidelines
-                        )
-                        
-                        # Store prompts in session state
-                        st.session_state['current_prompt'] = shacl_prompt
-                        
+                    # Store prompts in session state
+                    st.session_state['current_prompt'] = shacl_prompt
+                    
+                    # Shapes are stored under the id of their legal text together with a
+                    # digest of the examples, feedback and guidelines. When the text was
+                    # already processed with the same context, even before a restart, the
+                    # stored shape is reused and the LLM call is skipped. The data fields
+                    # are not part of the digest, since the first generation adds to them.
+                    context_digest = generator.context_digest(text_id)
+                    stored_shape = shape_store.get_shape(text_id)
+                    if stored_shape is not None and stored_shape.context_digest == context_digest and not force_shacl:
+                        st.session_state['current_shape'] = stored_shape.graph
+                        st.session_state['current_text_id'] = text_id
+                        st.session_state['debug_output'] = "\n".join(debug_output)
+                        st.info("Reusing the stored shape for this text. Tick \"Force regenerate\" to generate it again.")
+                    else:
                         # Generate the shape and extract rules
-                        shape, new_fields = generator.generate_shape(legal_text, text_id)
+                        shape, new_fields = generator.generate_shape(legal_text, text_id, prompt=shacl_prompt)
                         
                         st.session_state['current_shape'] = shape
                         st.session_state['current_text_id'] = text_id
@@ -336,19 +459,17 @@ if mode == "Generation Journey":
                             shape_id=text_id,
                             legal_text=legal_text,
                             graph=shape,
-                            description="Generated from legal text"
+                            description="Generated from legal text",
+                            context_digest=context_digest
                         )
                         
                         st.success("SHACL shape generated!")
-                    finally:
-                        # Restore original print function
-                        builtins.print = old_print
             else:
                 st.warning("Please provide some legal text first.")                    
 
         st.header("Generated SHACL Shape")
         
-        if 'current_shape' in st.session_state:
+        if st.session_state['current_shape'] is not None:
             # Add tabs for shape, prompts, validation, and debug
             shacl_tab1, shacl_tab2, shacl_tab3, shacl_tab4, shacl_tab5 = st.tabs([
                 "SHACL Shape", 
@@ -359,7 +480,7 @@ if mode == "Generation Journey":
             ])
             
             with shacl_tab1:
-                shape_text = st.session_state['current_shape'].serialize(format='turtle')
+                shape_text = turtle_of(st.session_state['current_shape'])
                 st.text_area("SHACL Shape", shape_text, height=300)
                 
                 # Deploy second agent to improve shape
@@ -384,7 +505,7 @@ if mode == "Generation Journey":
                         generator.context.add_feedback(
                             st.session_state['current_text_id'],
                             feedback,
-                            improved_shape.serialize(format='turtle')
+                            turtle_of(improved_shape)
                         )
                         generator.context.save(CONTEXT_PATH)
                         st.session_state['current_shape'] = improved_shape
@@ -410,7 +531,7 @@ if mode == "Generation Journey":
             with shacl_tab4:
                 selected_instance = st.selectbox(
                     "Select Instance to Validate",
-                    options=list(instance_store.instances.keys()),
+                    options=tuple(instance_store.instances),
                     key="validate_instance_select"
                 )
                 
@@ -434,7 +555,7 @@ if mode == "Generation Journey":
                             st.json(instance.properties)
                             st.text_area(
                                 "Instance Graph",
-                                instance.graph.serialize(format='turtle'),
+                                turtle_of(instance.graph),
                                 height=200
                             )
                             
@@ -442,85 +563,52 @@ if mode == "Generation Journey":
                         st.error(f"Error during validation: {str(e)}")
             
             with shacl_tab5:
-                if 'debug_output' in st.session_state:
+                if st.session_state['debug_output'] is not None:
                     st.text(st.session_state['debug_output'])         
     
     with tab3:
         st.header("Shacl Input")                
                                     
-        if len(st.session_state['logic_input_shape']) > 0:
-            logic_text = st.text_area(
-                "Input shape", 
-                value=st.session_state['logic_input_shape'],
-                height=300,
-                key="logic_agent_input"  # Added unique key
-            )
-                    
-        else:
-            logic_text = st.text_area(
-                "Or paste shacl shape directly",
-                height=300,
-                key="logic_agent_input"  # Changed key                
-            )                              
-
-        # Display token count and generate button side by side
-        col_tokens, col_button = st.columns([3,1])
-        
-        # Create debug container before handling button
-        debug_output = []
-        
-        with col_tokens:
-            if logic_text:
-                token_count = count_tokens(logic_text)
-                st.write(f"Token count: **{token_count:,}**")
-        
-        with col_button:
-            update_shacl_button = st.button("Update Shape")        
+        logic_text = logic_text_input()
+        force_logic = st.checkbox("Force regenerate", key="force_logic")
+        update_shacl_button = st.button("Update Shape")
             
         if update_shacl_button:
             if logic_text:
-                with st.spinner("Updating SHACL shape..."):
-                    # Only create output list, remove debug container
-                    debug_output = []
+                with st.spinner("Updating SHACL shape..."), capture_debug_output() as debug_output:
+                    # Generate unique ID for the text
+                    text_id = text_id_of(logic_text)
                     
-                    # Store original print and replace it
-                    old_print = print
-                    import builtins
-                    builtins.print = custom_print
+                    if force_logic:
+                        cached_deploy_second_agent.clear(logic_text)
+                    fields_version = field_registry.version
+                    improved_text, new_fields = cached_deploy_second_agent(logic_text)
+                    improved_shape = Graph().parse(data=improved_text, format='turtle')
+                                                    
+                    st.session_state['current_logic_shape'] = improved_shape
+                    st.session_state['current_logic_text_id'] = text_id
                     
-                    try:
-                        # Generate unique ID for the text
-                        text_id = str(hash(logic_text))
-                        
-                        improved_shape, new_fields = generator.deploy_second_agent(logic_text)
-                                                        
-                        st.session_state['current_logic_shape'] = improved_shape
-                        st.session_state['current_logic_text_id'] = text_id
-                        
-                        if new_fields:
-                            st.info(f"Added {len(new_fields)} new data fields")
-                            for field in new_fields:
-                                st.write(f"- {field.name} ({field.datatype})")
-                        
-                        # Store the generated shape
-                        shape_store.add_shape(
-                            shape_id=text_id,
-                            legal_text=logic_text,
-                            graph=improved_shape,
-                            description="Update with logic agent"
-                        )
-                        
-                        st.success("SHACL shape updated!")
-                    finally:
-                        # Restore original print function
-                        builtins.print = old_print
+                    if new_fields and field_registry.version != fields_version:
+                        st.info(f"Added {len(new_fields)} new data fields")
+                        for field in new_fields:
+                            st.write(f"- {field.name} ({field.datatype})")
+                    
+                    # Store the generated shape
+                    shape_store.add_shape(
+                        shape_id=text_id,
+                        legal_text=logic_text,
+                        graph=improved_shape,
+                        description="Update with logic agent"
+                    )
+                    
+                    st.success("SHACL shape updated!")
             else:
                 st.warning("Please provide some shacl shape first.")                    
 
         st.header("Updated SHACL Shape")
 
-        if 'current_logic_shape' in st.session_state:
-            shape_text = st.session_state['current_logic_shape'].serialize(format='turtle')
+        if st.session_state['current_logic_shape'] is not None:
+            shape_text = turtle_of(st.session_state['current_logic_shape'])
             st.text_area("Updated SHACL Shape", shape_text, height=300)
 
 
@@ -540,14 +628,13 @@ elif mode == "Manage Shapes":
                     st.text(f"Description: {shape.description}")
             
             with col2:
-                if st.button("🗑️ Delete", key=f"delete_shape_{shape_id}"):
-                    shape_store.delete_shape(shape_id)
-                    st.success(f"Shape {shape_id} deleted!")
-                    st.rerun()
+                st.button("🗑️ Delete", key=f"delete_shape_{shape_id}", on_click=delete_shape, args=(shape_id,))
             
-            # Show legal text and shape
-            st.text_area("Legal Text", shape.legal_text, height=200, key=f"legal_text_{shape_id}")
-            st.text_area("SHACL Shape", shape.graph.serialize(format='turtle'), height=300, key=f"shape_{shape_id}")
+            # Show legal text and shape. Expander bodies run even when collapsed,
+            # so the texts are only rendered once asked for
+            if st.toggle("Show legal text and shape", key=f"open_{shape_id}"):
+                st.text_area("Legal Text", shape.legal_text, height=200, key=f"legal_text_{shape_id}")
+                st.text_area("SHACL Shape", turtle_of(shape.graph), height=300, key=f"shape_{shape_id}")
             
             # Add update functionality
             new_description = st.text_input("New Description", 
@@ -584,7 +671,7 @@ elif mode == "Manage Examples":
                         if uploaded_text_file.type == "application/pdf":
                             text = extract_text_from_pdf(uploaded_text_file)
                         else:  # txt file
-                            text = uploaded_text_file.read().decode()
+                            text = read_text_upload(uploaded_text_file)
                         
                         # Truncate if too long
                         text = truncate_text(text)
@@ -615,7 +702,7 @@ elif mode == "Manage Examples":
                         type=['ttl'],
                         key="example_shape"
                     )
-                    shape_content = uploaded_shape.read().decode() if uploaded_shape else None
+                    shape_content = read_turtle_upload(uploaded_shape) if uploaded_shape else None
                 else:
                     shape_content = st.text_area(
                         "Paste SHACL Shape (Turtle format)",
@@ -631,70 +718,56 @@ elif mode == "Manage Examples":
             
             if st.button("Save Example"):
                 if any(legal_texts) and shape_content:
-                    # Create temporary files
-                    with tempfile.TemporaryDirectory() as tmpdir:
-                        tmpdir = Path(tmpdir)
-                        
-                        # Save all legal texts
-                        text_paths = []
-                        for i, text in enumerate(legal_texts):
-                            if text:  # Only save non-empty texts
-                                text_path = tmpdir / f"text_{i}.txt"
-                                with open(text_path, 'w') as f:
-                                    f.write(text)
-                                text_paths.append(text_path)
-                        
-                        # Save shape
-                        shape_path = tmpdir / "shape.ttl"
-                        with open(shape_path, 'w') as f:
-                            f.write(shape_content)
-                        
-                        # Save annotations if provided
-                        annotations_path = None
-                        if annotations:
-                            annotations_path = tmpdir / "annotations.yaml"
-                            with open(annotations_path, 'w') as f:
-                                f.write(annotations)
-                        
-                        # Add example for each text
-                        for text_path in text_paths:
-                            example_store.add_example(text_path, shape_path, annotations_path)
-                        
-                        st.success(f"Added {len(text_paths)} examples successfully!")
+                    # The store parses the pasted content directly, no temporary files needed
+                    texts = [text for text in legal_texts if text]  # Only keep non-empty texts
+                    # Skip texts that already have an example, before paying for the shape parse
+                    new_texts = [text for text in dict.fromkeys(texts) if not example_store.has_legal_text(text)]
+                    if len(new_texts) < len(texts):
+                        st.warning(f"Skipped {len(texts) - len(new_texts)} legal texts that are duplicates or already have an example.")
+                    if new_texts:
+                        example_store.add_examples_from_text(new_texts, shape_content, annotations or None)
+                        st.success(f"Added {len(new_texts)} examples successfully!")
                 else:
                     st.warning("Please provide at least one legal text and SHACL shape.")
     
     # View existing examples
     st.subheader("Existing Examples")
-    for i, example in enumerate(example_store.examples):
+    first, last = page_bounds(len(example_store.examples), EXAMPLES_PAGE_SIZE, key="examples_page")
+    page_examples = example_store.examples[first:last]
+    example_token_counts = count_tokens_batch(
+        tuple(example.legal_text for example in page_examples)
+    )
+    for i, example in enumerate(page_examples, start=first):
         with st.expander(f"Example {i+1}"):
             # Add delete button in the header
             col_title, col_delete = st.columns([5,1])
             with col_title:
                 st.subheader(f"Example {i+1}")
             with col_delete:
-                if st.button("🗑️ Delete", key=f"delete_example_{i}"):
-                    example_store.delete_example(i)  # We'll need to add this method
-                    st.success(f"Example {i+1} deleted!")
-                    st.rerun()  # Refresh the page to show updated list
-            
-            col1, col2 = st.columns(2)
+                st.button("🗑️ Delete", key=f"delete_example_{i}", on_click=delete_example, args=(i,))
             
-            with col1:
-                st.text_area(
-                    "Legal Text", 
-                    example.legal_text, 
-                    height=200,
-                    key=f"view_text_{i}"
-                )
+            st.write(f"Token count: **{example_token_counts[i - first]:,}**")
             
-            with col2:
-                st.text_area(
-                    "SHACL Shape", 
-                    example.shacl_shape.serialize(format='turtle'),
-                    height=200,
-                    key=f"view_shape_{i}"
-                )
+            # Expander bodies run even when collapsed, so the texts are only
+            # rendered once asked for
+            if st.toggle("Show legal text and shape", key=f"open_example_{i}"):
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    st.text_area(
+                        "Legal Text", 
+                        example.legal_text, 
+                        height=200,
+                        key=f"view_text_{i}"
+                    )
+                
+                with col2:
+                    st.text_area(
+                        "SHACL Shape", 
+                        turtle_of(example.shacl_shape),
+                        height=200,
+                        key=f"view_shape_{i}"
+                    )
             
             if example.annotations:
                 st.text_area(
@@ -728,61 +801,42 @@ elif mode == "Manage Guidelines":
             st.text_area(f"Guideline {i+1}", guideline, height=100, key=f"guideline_{i}")
             
         with col2:
-            if st.button("🗑️ Delete", key=f"delete_guideline_{i}"):
-                generator.context.remove_guideline(i)  # We'll add this method
-                generator.context.save(CONTEXT_PATH)
-                st.success(f"Guideline {i+1} deleted!")
-                st.rerun()
+            st.button("🗑️ Delete", key=f"delete_guideline_{i}", on_click=delete_guideline, args=(i,))
 
 elif mode == "Manage Instances":
     st.header("Instance Management")
     
     # Create new instance
     with st.expander("Create New Instance"):
-        instance_id = st.text_input("Instance ID", placeholder="e.g., john_doe_1")
+        # A form only reruns the script on submit, not on every field edit
+        with st.form("create_instance", clear_on_submit=True):
+            instance_id = st.text_input("Instance ID", placeholder="e.g., john_doe_1")
         
-        properties = {}
-        for field in field_registry.fields.values():
-            # Check if field has allowed values in constraints
-            if field.constraints and 'allowed_values' in field.constraints:
-                # Create options list from allowed values
-                options = [val['id'] for val in field.constraints['allowed_values']]
-                labels = {val['id']: val.get('label', val['id']) 
-                         for val in field.constraints['allowed_values']}
+            properties = {}
+            for field in field_registry.fields.values():
+                # Check if field has allowed values in constraints
+                if field.constraints and 'allowed_values' in field.constraints:
+                    options, labels = field_registry.allowed_value_options(field.name)
                 
-                value = st.selectbox(
-                    f"{field.name}",
-                    options=options,
-                    format_func=lambda x: labels[x],
-                    help=field.description
-                )
-            else:
-                # Handle other datatypes as before
-                if field.datatype == 'xsd:string':
-                    value = st.text_input(f"{field.name}", help=field.description)
-                elif field.datatype == 'xsd:integer':
-                    value = st.number_input(f"{field.name}", help=field.description, step=1)
-                elif field.datatype == 'xsd:decimal':
-                    value = st.number_input(f"{field.name}", help=field.description)
-                elif field.datatype == 'xsd:boolean':
-                    value = st.checkbox(f"{field.name}", help=field.description)
-                elif field.datatype == 'xsd:date':
-                    value = st.date_input(
-                        f"{field.name}", 
-                        help=field.description,
-                        min_value=datetime.date(1900, 1, 1),  # Allow dates from 1900
-                        max_value=datetime.date.today()  # Up to today
+                    value = st.selectbox(
+                        f"{field.name}",
+                        options=options,
+                        format_func=labels.__getitem__,
+                        help=field.description
                     )
+                else:
+                    widget = DATATYPE_WIDGETS.get(field.datatype, st.text_input)
+                    value = widget(f"{field.name}", help=field.description)
             
-            if value:
-                properties[field.name] = value
+                if value:
+                    properties[field.name] = value
         
-        if st.button("Create Instance"):
-            try:
-                instance = instance_store.create_instance(instance_id, properties)
-                st.success(f"Created instance {instance_id}")
-            except ValueError as e:
-                st.error(str(e))
+            if st.form_submit_button("Create Instance"):
+                try:
+                    instance = instance_store.create_instance(instance_id, properties)
+                    st.success(f"Created instance {instance_id}")
+                except ValueError as e:
+                    st.error(str(e))
     
     # View and validate instances
     st.subheader("Existing Instances")
@@ -792,27 +846,22 @@ elif mode == "Manage Instances":
     with col1:
         selected_instance = st.selectbox(
             "Select Instance",
-            options=list(instance_store.instances.keys())
+            options=tuple(instance_store.instances)
         )
         
         if selected_instance:
             # Add delete button
             col_info, col_delete = st.columns([5,1])
             with col_delete:
-                if st.button("🗑️ Delete", key=f"delete_instance_{selected_instance}"):
-                    try:
-                        instance_store.delete_instance(selected_instance)
-                        st.success(f"Instance {selected_instance} deleted!")
-                        st.rerun()  # Refresh the page
-                    except ValueError as e:
-                        st.error(str(e))
+                st.button("🗑️ Delete", key=f"delete_instance_{selected_instance}", on_click=delete_instance, args=(selected_instance,))
             
             with col_info:
-                st.json(instance_store.instances[selected_instance].properties)
+                instance = instance_store.instances[selected_instance]
+                st.json(instance.properties)
                 
                 st.text_area(
                     "RDF Graph",
-                    instance_store.instances[selected_instance].graph.serialize(format='turtle'),
+                    turtle_of(instance.graph),
                     height=200
                 )
 
@@ -822,31 +871,40 @@ elif mode == "Manage Feedback":
     if not generator.context.feedback_history:
         st.info("No feedback history available yet.")
     else:
-        for i, feedback_item in enumerate(generator.context.feedback_history):
+        # Only one page of feedback items is rendered per run
+        feedback_history = generator.context.feedback_history
+        text_id_filter = st.text_input("Filter by text ID").strip()
+        if text_id_filter:
+            indices = generator.context.feedback_indices(text_id_filter)
+            if not indices:
+                st.info("No feedback for this text ID.")
+        else:
+            indices = range(len(feedback_history))
+        first, last = page_bounds(len(indices), FEEDBACK_PAGE_SIZE, key="feedback_page")
+        
+        for i in indices[first:last]:
+            feedback_item = feedback_history[i]
             with st.expander(f"Feedback {i+1} (Text ID: {feedback_item.text_id})"):
                 col1, col2 = st.columns([5,1])
                 
                 with col1:
-                    st.text_area(
-                        "Feedback",
-                        feedback_item.feedback,
-                        height=100,
-                        key=f"feedback_{i}"
-                    )
-                    
-                    st.text_area(
-                        "Improved Shape",
-                        feedback_item.improved_shape,
-                        height=200,
-                        key=f"improved_shape_{i}"
-                    )
+                    if st.toggle("Show feedback and shape", key=f"open_feedback_{i}"):
+                        st.text_area(
+                            "Feedback",
+                            feedback_item.feedback,
+                            height=100,
+                            key=f"feedback_{i}"
+                        )
+                        
+                        st.text_area(
+                            "Improved Shape",
+                            feedback_item.improved_shape,
+                            height=200,
+                            key=f"improved_shape_{i}"
+                        )
                 
                 with col2:
-                    if st.button("🗑️ Delete", key=f"delete_feedback_{i}"):
-                        generator.context.remove_feedback(i)  # We'll add this method
-                        generator.context.save(CONTEXT_PATH)
-                        st.success(f"Feedback {i+1} deleted!")
-                        st.rerun()
+                    st.button("🗑️ Delete", key=f"delete_feedback_{i}", on_click=delete_feedback, args=(i,))
 
 elif mode == "Consolidate Data Fields":
     st.header("Consolidate Data Fields")
@@ -876,11 +934,12 @@ else:  # Manage Data Fields mode
                 key="field_definitions"
             )
             
-            if uploaded_shacl:
-                shacl_content = uploaded_shacl.read().decode()
+            shacl_content = read_turtle_upload(uploaded_shacl) if uploaded_shacl else None
+            if shacl_content is not None:
                 if st.button("Import Fields from File"):
                     try:
-                        imported_fields = field_registry.import_from_shacl(shacl_content)
+                        with st.spinner("Importing fields..."):
+                            imported_fields = field_registry.import_from_shacl(shacl_content)
                         if imported_fields:
                             st.success(f"Successfully imported {len(imported_fields)} fields: {', '.join(imported_fields)}")
                         else:
@@ -889,15 +948,19 @@ else:  # Manage Data Fields mode
                         st.error(f"Error importing fields: {str(e)}")
         
         with col2:
-            shacl_text = st.text_area(
-                "Or paste SHACL content",
-                height=200,
-                placeholder="Paste your SHACL Turtle content here..."
-            )
-            
-            if shacl_text and st.button("Import Fields from Text"):
+            # Editing the pasted text does not rerun the script until the form is submitted
+            with st.form("import_fields_text"):
+                shacl_text = st.text_area(
+                    "Or paste SHACL content",
+                    height=200,
+                    placeholder="Paste your SHACL Turtle content here..."
+                )
+                submitted = st.form_submit_button("Import Fields from Text")
+
+            if submitted and shacl_text:
                 try:
-                    imported_fields = field_registry.import_from_shacl(shacl_text)
+                    with st.spinner("Importing fields..."):
+                        imported_fields = field_registry.import_from_shacl(shacl_text)
                     if imported_fields:
                         st.success(f"Successfully imported {len(imported_fields)} fields: {', '.join(imported_fields)}")
                     else:
@@ -908,40 +971,61 @@ else:  # Manage Data Fields mode
     # View and edit existing fields
     st.subheader("Existing Data Fields")
     
-    for field_name, field in field_registry.fields.items():
-        with st.expander(f"Field: {field_name}"):
-            col1, col2 = st.columns([3, 1])
-            
-            with col1:
-                st.text(f"Path: {field.path}")
-                st.text_area("Description", field.description, key=f"desc_{field_name}")
-            
-            with col2:
-                # Datatype selection
-                datatype_options = [
+    # All fields go into one table instead of a set of widgets per field
+    field_rows = [
+        {
+            "name": field.name,
+            "path": field.path,
+            "datatype": field.datatype,
+            "description": field.description
+        }
+        for field in field_registry.fields.values()
+    ]
+    edited_rows = st.data_editor(
+        field_rows,
+        column_config={
+            "datatype": st.column_config.SelectboxColumn(
+                "datatype",
+                options=[
                     "xsd:string",
                     "xsd:integer",
                     "xsd:decimal",
                     "xsd:boolean",
                     "xsd:date"
-                ]
-                new_datatype = st.selectbox(
-                    "Datatype",
-                    options=datatype_options,
-                    index=datatype_options.index(field.datatype),
-                    key=f"datatype_{field_name}"
-                )
-                
-                if new_datatype != field.datatype:
-                    if st.button("Update Datatype", key=f"update_{field_name}"):
-                        try:
-                            field_registry.update_field_datatype(field_name, new_datatype)
-                            field_registry.save()
-                            st.success(f"Updated datatype for {field_name}")
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Error updating datatype: {str(e)}")
-            
-            # Show constraints
-            if field.constraints:
-                st.json(field.constraints)
\ No newline at end of file
+                ],
+                required=True
+            )
+        },
+        disabled=["name", "path", "description"],
+        hide_index=True,
+        use_container_width=True,
+        key="data_fields_editor"
+    )
+    
+    changed_datatypes = {
+        edited["name"]: edited["datatype"]
+        for row, edited in zip(field_rows, edited_rows)
+        if edited["datatype"] != row["datatype"]
+    }
+    if changed_datatypes and st.button("Update Datatypes"):
+        try:
+            for field_name, new_datatype in changed_datatypes.items():
+                field_registry.update_field_datatype(field_name, new_datatype)
+            field_registry.save()
+            st.success(f"Updated datatype for {', '.join(changed_datatypes)}")
+            st.rerun()
+        except Exception as e:
+            st.error(f"Error updating datatype: {str(e)}")
+    
+    # Constraints are shown for one field at a time, allowed value lists
+    # can be long
+    constrained_fields = [name for name, field in field_registry.fields.items() if field.constraints]
+    if constrained_fields:
+        constraints_field = st.selectbox(
+            "Show constraints of",
+            options=constrained_fields,
+            index=None,
+            placeholder="Select a field"
+        )
+        if constraints_field:
+            st.json(field_registry.fields[constraints_field].constraints)
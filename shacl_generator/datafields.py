@@ -1,10 +1,32 @@
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional, Set
+from typing import List, Dict, Optional, Set, Tuple
 from pathlib import Path
+from functools import lru_cache
+import logging
 import yaml
-from rdflib import Graph, URIRef, Literal, Namespace, BNode
+from rdflib import Graph, Literal, Namespace, BNode
+from rdflib.collection import Collection
 from rdflib.namespace import RDF, RDFS, XSD, SH
 
+logger = logging.getLogger(__name__)
+
+# Namespaces used when importing fields from SHACL
+FF = Namespace("https://foerderfunke.org/default#")
+SCHEMA = Namespace("http://schema.org/")
+SH_IN = SH['in']
+
+# Use the libyaml based dumper and loader when PyYAML was built with it
+YAML_DUMPER = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+@lru_cache(maxsize=8)
+def parse_shacl(shacl_content: str) -> Graph:
+    """Parse SHACL Turtle, reusing the graph when the same content is imported again.
+    The import only reads the graph, so sharing it between imports is safe."""
+    g = Graph()
+    g.parse(data=shacl_content, format='turtle')
+    return g
+
 @dataclass
 class DataField:
     name: str  # The field name (e.g., "age", "income")
@@ -19,6 +41,12 @@ class DataFieldRegistry:
     def __init__(self, storage_path: Path):
         self.storage_path = storage_path
         self.fields: Dict[str, DataField] = {}
+        # Bumped on every change, lets callers cache data derived from the fields
+        self.version = 0
+        self._saved_version = 0
+        # Options and labels of fields with allowed values, valid for _options_version
+        self._options: Dict[str, Tuple[List[str], Dict[str, str]]] = {}
+        self._options_version = 0
         self.load()
         
     def import_from_shacl(self, shacl_content: str) -> List[str]:
@@ -26,20 +54,14 @@ class DataFieldRegistry:
         Import data fields from a SHACL file.
         Returns a list of imported field names.
         """
-        g = Graph()
         try:
-            g.parse(data=shacl_content, format='turtle')
+            g = parse_shacl(shacl_content)
         except Exception as e:
             raise ValueError(f"Failed to parse SHACL content: {str(e)}")
         
-        # Define namespaces
-        sh = SH
-        ff = Namespace("https://foerderfunke.org/default#")
-        schema = Namespace("http://schema.org/")
-        
         # First collect all answer options and their labels
         answer_options = {}
-        for ao_uri in g.subjects(RDF.type, ff.AnswerOption):
+        for ao_uri in g.subjects(RDF.type, FF.AnswerOption):
             ao_id = str(ao_uri).split('#')[-1]
             # Try to get English label first, then any label
             label = None
@@ -55,14 +77,21 @@ class DataFieldRegistry:
                 'label': label or ao_id
             }
         
-        print(f"Found {len(answer_options)} answer options")
+        logger.debug("Found %s answer options", len(answer_options))
         for uri, ao in answer_options.items():
-            print(f"Answer option: {uri} -> {ao}")
+            logger.debug("Answer option: %s -> %s", uri, ao)
         
         imported_fields: Set[str] = set()
         
+        # Constraints that are not typed themselves fall back to the first
+        # property or node shape of the graph, look those up once for all fields
+        prop_shapes = list(g.subjects(RDF.type, SH.PropertyShape))
+        node_shapes = list(g.subjects(RDF.type, SH.NodeShape))
+        fallback_prop_shape = prop_shapes[0] if prop_shapes else None
+        fallback_node_shape = node_shapes[0] if node_shapes else None
+        
         # Find all DataField instances
-        for field_uri in g.subjects(RDF.type, ff.DataField):
+        for field_uri in g.subjects(RDF.type, FF.DataField):
             try:
                 # Get field name from URI
                 field_name = str(field_uri).split('#')[-1]
@@ -89,7 +118,7 @@ class DataFieldRegistry:
                 
                 # If no comment, try schema:question
                 if not description:
-                    for q in g.objects(field_uri, schema.question):
+                    for q in g.objects(field_uri, SCHEMA.question):
                         if isinstance(q, Literal):
                             if q.language == 'en':
                                 description = q
@@ -98,7 +127,7 @@ class DataFieldRegistry:
                                 description = q
                 
                 # Get category
-                category = g.value(field_uri, schema.category, None, any=False)
+                category = g.value(field_uri, SCHEMA.category, None, any=False)
                 if category:
                     category = str(category).split('#')[-1]
                 
@@ -106,102 +135,76 @@ class DataFieldRegistry:
                 constraints = {}
                 
                 # Look for object constraints
-                print(f"\nProcessing field: {field_name}")
-                obj_constraints_list = list(g.objects(field_uri, ff.objectConstraints))
-                print(f"Found {len(obj_constraints_list)} object constraints")
+                logger.debug("Processing field: %s", field_name)
+                obj_constraints_list = list(g.objects(field_uri, FF.objectConstraints))
+                logger.debug("Found %s object constraints", len(obj_constraints_list))
                 
                 for obj_constraints in obj_constraints_list:
-                    print(f"Found object constraints: {obj_constraints}")
+                    logger.debug("Found object constraints: %s", obj_constraints)
                     # For blank nodes, we need to look at their properties directly
                     if (obj_constraints, RDF.type, SH.PropertyShape) in g:
                         prop_shape = obj_constraints
-                        print("Found property shape (direct)")
+                        logger.debug("Found property shape (direct)")
                     else:
                         # Try to find property shape through blank node
-                        prop_shapes = list(g.subjects(RDF.type, SH.PropertyShape))
-                        print(f"Found {len(prop_shapes)} property shapes through type")
-                        prop_shape = None
-                        for ps in prop_shapes:
-                            if any(pred == RDF.type and obj == SH.PropertyShape 
-                                 for pred, obj in g.predicate_objects(ps)):
-                                prop_shape = ps
-                                print(f"Found property shape through blank node: {ps}")
-                                break
+                        logger.debug("Found %s property shapes through type", len(prop_shapes))
+                        prop_shape = fallback_prop_shape
+                        if prop_shape:
+                            logger.debug("Found property shape through blank node: %s", prop_shape)
                     
                     if prop_shape:
-                        print("Processing property shape")
+                        logger.debug("Processing property shape")
                         # Get target objects
                         target_objects = g.value(prop_shape, SH.targetObjectsOf)
                         if target_objects:
-                            print(f"Found targetObjectsOf: {target_objects}")
+                            logger.debug("Found targetObjectsOf: %s", target_objects)
                             constraints['targetObjectsOf'] = str(target_objects)
                         
                         # Get datatype
                         datatype = g.value(prop_shape, SH.datatype)
                         if datatype:
-                            print(f"Found datatype: {datatype}")
+                            logger.debug("Found datatype: %s", datatype)
                             datatype_str = str(datatype)
                             if '#' in datatype_str:
                                 datatype_str = 'xsd:' + datatype_str.split('#')[-1]
                             constraints['datatype'] = datatype_str
                         
                         # Get allowed values (sh:in)
-                        in_prop = URIRef(SH + 'in')
-                        print(f"Looking for sh:in with property: {in_prop}")
+                        logger.debug("Looking for sh:in with property: %s", SH_IN)
                         allowed_values = []
                         
-                        def traverse_rdf_list(list_node):
-                            """Helper function to traverse an RDF list and collect its items."""
-                            items = []
-                            try:
-                                print(f"Traversing RDF list starting at: {list_node}")
-                                # Get all triples involving this node
-                                for p, o in g.predicate_objects(list_node):
-                                    print(f"Found predicate-object: {p} -> {o}")
-                                
-                                while list_node:
-                                    first = g.value(list_node, RDF.first)
-                                    if first:
-                                        print(f"Found list item: {first}")
-                                        items.append(first)
-                                    
-                                    list_node = g.value(list_node, RDF.rest)
-                                    print(f"Next node: {list_node}")
-                                    
-                                    if list_node == RDF.nil:
-                                        break
-                            except Exception as e:
-                                print(f"Error traversing list: {e}")
-                            return items
-                        
                         # Get the sh:in value
-                        in_values = list(g.objects(prop_shape, in_prop))
-                        print(f"Direct sh:in values: {in_values}")
+                        in_values = list(g.objects(prop_shape, SH_IN))
+                        logger.debug("Direct sh:in values: %s", in_values)
                         
                         for val in in_values:
                             if isinstance(val, BNode):
-                                print(f"Found blank node for sh:in: {val}")
+                                logger.debug("Found blank node for sh:in: %s", val)
                                 # Try to traverse as RDF list
-                                items = traverse_rdf_list(val)
-                                if items:
+                                try:
+                                    items = list(Collection(g, val))
+                                except Exception as e:
+                                    # Skip only this list, a broken list yields no allowed values
+                                    logger.warning("Error traversing list: %s", e)
+                                else:
                                     allowed_values.extend(items)
                             else:
                                 allowed_values.append(val)
                         
-                        print(f"Final allowed values: {allowed_values}")
+                        logger.debug("Final allowed values: %s", allowed_values)
                         
                         if allowed_values:
                             value_options = []
                             for value in allowed_values:
                                 value_uri = str(value)
-                                print(f"Processing value: {value_uri}")
+                                logger.debug("Processing value: %s", value_uri)
                                 if value_uri in answer_options:
-                                    print(f"Found in answer options: {answer_options[value_uri]}")
+                                    logger.debug("Found in answer options: %s", answer_options[value_uri])
                                     value_options.append(answer_options[value_uri])
                                 else:
                                     # Fallback if not found in answer options
                                     value_id = value_uri.split('#')[-1]
-                                    print(f"Not found in answer options, using ID: {value_id}")
+                                    logger.debug("Not found in answer options, using ID: %s", value_id)
                                     value_options.append({
                                         'id': value_id,
                                         'label': value_id
@@ -209,56 +212,51 @@ class DataFieldRegistry:
                             constraints['allowed_values'] = value_options
                 
                 # Look for usage constraints
-                usage_constraints_list = list(g.objects(field_uri, ff.usageConstraints))
-                print(f"Found {len(usage_constraints_list)} usage constraints")
+                usage_constraints_list = list(g.objects(field_uri, FF.usageConstraints))
+                logger.debug("Found %s usage constraints", len(usage_constraints_list))
                 
                 for usage_constraints in usage_constraints_list:
-                    print(f"Found usage constraints: {usage_constraints}")
+                    logger.debug("Found usage constraints: %s", usage_constraints)
                     # For blank nodes, we need to look at their properties directly
                     if (usage_constraints, RDF.type, SH.NodeShape) in g:
                         node_shape = usage_constraints
-                        print("Found node shape (direct)")
+                        logger.debug("Found node shape (direct)")
                     else:
                         # Try to find node shape through blank node
-                        node_shapes = list(g.subjects(RDF.type, SH.NodeShape))
-                        print(f"Found {len(node_shapes)} node shapes through type")
-                        node_shape = None
-                        for ns in node_shapes:
-                            if any(pred == RDF.type and obj == SH.NodeShape 
-                                 for pred, obj in g.predicate_objects(ns)):
-                                node_shape = ns
-                                print(f"Found node shape through blank node: {ns}")
-                                break
+                        logger.debug("Found %s node shapes through type", len(node_shapes))
+                        node_shape = fallback_node_shape
+                        if node_shape:
+                            logger.debug("Found node shape through blank node: %s", node_shape)
                     
                     if node_shape:
-                        print("Processing node shape")
+                        logger.debug("Processing node shape")
                         # Get target subjects
                         target_subjects = g.value(node_shape, SH.targetSubjectsOf)
                         if target_subjects:
-                            print(f"Found targetSubjectsOf: {target_subjects}")
+                            logger.debug("Found targetSubjectsOf: %s", target_subjects)
                             constraints['targetSubjectsOf'] = str(target_subjects)
                         
                         # Look for property constraints
                         for prop in g.objects(node_shape, SH.property):
-                            print(f"Found property constraint: {prop}")
+                            logger.debug("Found property constraint: %s", prop)
                             # Get cardinality constraints
                             min_count = g.value(prop, SH.minCount)
                             if min_count:
-                                print(f"Found minCount: {min_count}")
+                                logger.debug("Found minCount: %s", min_count)
                                 constraints['minCount'] = str(min_count)
                             max_count = g.value(prop, SH.maxCount)
                             if max_count:
-                                print(f"Found maxCount: {max_count}")
+                                logger.debug("Found maxCount: %s", max_count)
                                 constraints['maxCount'] = str(max_count)
                             
                             # Get path to verify it matches our field
                             path = g.value(prop, SH.path)
                             if path:
-                                print(f"Found path: {path}")
+                                logger.debug("Found path: %s", path)
                                 if str(path) != str(field_uri):
-                                    print(f"Path mismatch: {path} != {field_uri}")
+                                    logger.debug("Path mismatch: %s != %s", path, field_uri)
                 
-                print(f"Final constraints for {field_name}: {constraints}")
+                logger.debug("Final constraints for %s: %s", field_name, constraints)
                 
                 # Create field
                 field = DataField(
@@ -273,24 +271,46 @@ class DataFieldRegistry:
                 if 'allowed_values' in constraints:
                     field.examples = [f"{opt['label']} ({opt['id']})" for opt in constraints['allowed_values']]
                 
-                # Add field to registry
-                self.add_field(field)
+                # Add field to registry, saved once after the loop
+                self.fields[field.name] = field
                 imported_fields.add(field_name)
             
             except Exception as e:
-                print(f"Warning: Failed to import field {field_uri}: {str(e)}")
+                logger.warning("Failed to import field %s: %s", field_uri, e)
                 continue
         
         if not imported_fields:
-            print("Warning: No valid data fields were found in the SHACL content")
+            logger.warning("No valid data fields were found in the SHACL content")
+        else:
+            self.version += 1
+            self.save()
         
         return list(imported_fields)
         
     def add_field(self, field: DataField) -> None:
         """Add a new data field to the registry."""
-        self.fields[field.name] = field
+        self.add_fields([field])
+        
+    def add_fields(self, fields: List[DataField]) -> None:
+        """Add several data fields to the registry, saving once for all of them."""
+        for field in fields:
+            self.fields[field.name] = field
+        self.version += 1
         self.save()
         
+    def allowed_value_options(self, field_name: str) -> Tuple[List[str], Dict[str, str]]:
+        """Option ids and their labels for a field with allowed values.
+        Built once per field and reused until the registry changes."""
+        if self._options_version != self.version:
+            self._options = {}
+            self._options_version = self.version
+        if field_name not in self._options:
+            allowed_values = self.fields[field_name].constraints['allowed_values']
+            options = [val['id'] for val in allowed_values]
+            labels = {val['id']: val.get('label', val['id']) for val in allowed_values}
+            self._options[field_name] = (options, labels)
+        return self._options[field_name]
+        
     def get_field(self, name: str) -> Optional[DataField]:
         """Get a field by its exact name."""
         return self.fields.get(name)
@@ -302,26 +322,31 @@ class DataFieldRegistry:
             term: The term to search for (e.g., "age", "years old")
             context: Additional context to help with matching
         """
+        term = term.lower()  # Once, not once per comparison
+        
         # First try exact matches
         for field in self.fields.values():
-            if term.lower() == field.name.lower():
+            if term == field.name.lower():
                 return field
-            if any(term.lower() == syn.lower() for syn in field.synonyms):
+            if any(term == syn.lower() for syn in field.synonyms):
                 return field
         
         # Then try partial matches
         for field in self.fields.values():
-            if term.lower() in field.name.lower():
+            if term in field.name.lower():
                 return field
-            if any(term.lower() in syn.lower() for syn in field.synonyms):
+            if any(term in syn.lower() for syn in field.synonyms):
                 return field
-            if any(term.lower() in ex.lower() for ex in field.examples):
+            if any(term in ex.lower() for ex in field.examples):
                 return field
         
         return None
     
     def save(self) -> None:
-        """Save the registry to disk."""
+        """Save the registry to disk if it has changed since the last save."""
+        if self.version == self._saved_version and self.storage_path.exists():
+            return
+        
         data = {
             name: {
                 "name": field.name,
@@ -336,7 +361,8 @@ class DataFieldRegistry:
         }
         
         with open(self.storage_path, 'w') as f:
-            yaml.dump(data, f, sort_keys=False)
+            yaml.dump(data, f, Dumper=YAML_DUMPER, sort_keys=False)
+        self._saved_version = self.version
     
     def load(self) -> None:
         """Load the registry from disk."""
@@ -344,7 +370,7 @@ class DataFieldRegistry:
             return
         
         with open(self.storage_path, 'r') as f:
-            data = yaml.safe_load(f)
+            data = yaml.load(f, Loader=YAML_LOADER)
             
         if data:
             self.fields = {
@@ -426,6 +452,7 @@ class DataFieldRegistry:
             
         # Update the field's datatype
         self.fields[field_name].datatype = new_datatype
+        self.version += 1
 
     def to_string(self) -> str:
         str = []
@@ -0,0 +1,32 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+
+# Debug output of the current script run. Each Streamlit session runs its
+# script in its own thread, so concurrent sessions never share a buffer.
+# This lives in the package rather than in app.py, because Streamlit executes
+# app.py in a fresh module on every rerun while the handler is attached once.
+debug_buffer: ContextVar[Optional[List[str]]] = ContextVar("debug_buffer", default=None)
+
+class DebugOutputHandler(logging.Handler):
+    """Log handler that stores records in the debug buffer of the current run."""
+    def emit(self, record: logging.LogRecord) -> None:
+        buffer = debug_buffer.get()
+        if buffer is not None:
+            buffer.append(self.format(record))
+
+def is_capturing() -> bool:
+    """Whether debug output of the current run is being collected.
+    Lets callers skip building expensive debug messages nobody reads."""
+    return debug_buffer.get() is not None
+
+@contextmanager
+def capture_debug_output() -> Iterator[List[str]]:
+    """Collect the log output of the shacl_generator package while active."""
+    buffer: List[str] = []
+    token = debug_buffer.set(buffer)
+    try:
+        yield buffer
+    finally:
+        debug_buffer.reset(token)
@@ -14,26 +14,52 @@ class ExampleStore:
     def __init__(self, examples_dir: Path):
         self.examples_dir = examples_dir
         self.examples: List[ExampleMapping] = []
+        # Number of examples per legal text, to spot duplicates without scanning the list
+        self._legal_text_counts: Dict[str, int] = {}
         
     def add_example(self, legal_text_path: Path, shacl_shape_path: Path, 
                    annotations_path: Optional[Path] = None) -> None:
         """Add a new example mapping to the store."""
-        with open(legal_text_path, 'r') as f:
-            legal_text = f.read()
-            
-        shacl_graph = Graph()
-        shacl_graph.parse(str(shacl_shape_path), format='turtle')
+        self.add_examples([legal_text_path], shacl_shape_path, annotations_path)
+        
+    def add_examples(self, legal_text_paths: List[Path], shacl_shape_path: Path,
+                     annotations_path: Optional[Path] = None) -> None:
+        """Add one example mapping per legal text, all sharing the same shape and annotations."""
+        legal_texts = []
+        for legal_text_path in legal_text_paths:
+            with open(legal_text_path, 'r') as f:
+                legal_texts.append(f.read())
+        
+        with open(shacl_shape_path, 'r') as f:
+            shacl_shape = f.read()
         
         annotations = None
         if annotations_path and annotations_path.exists():
             with open(annotations_path, 'r') as f:
-                annotations = yaml.safe_load(f)
+                annotations = f.read()
+        
+        self.add_examples_from_text(legal_texts, shacl_shape, annotations)
+        
+    def add_examples_from_text(self, legal_texts: List[str], shacl_shape: str,
+                               annotations: Optional[str] = None) -> None:
+        """Add one example mapping per legal text from in-memory content, without going through files."""
+        # Parse the shared shape and annotations once instead of once per legal text
+        shacl_graph = Graph()
+        shacl_graph.parse(data=shacl_shape, format='turtle')
+        
+        parsed_annotations = yaml.safe_load(annotations) if annotations else None
                 
-        self.examples.append(ExampleMapping(
-            legal_text=legal_text,
-            shacl_shape=shacl_graph,
-            annotations=annotations
-        ))
+        for legal_text in legal_texts:
+            self.examples.append(ExampleMapping(
+                legal_text=legal_text,
+                shacl_shape=shacl_graph,
+                annotations=parsed_annotations
+            ))
+            self._legal_text_counts[legal_text] = self._legal_text_counts.get(legal_text, 0) + 1
+        
+    def has_legal_text(self, legal_text: str) -> bool:
+        """Check whether an example with this legal text already exists."""
+        return legal_text in self._legal_text_counts
         
     def save_example(self, example: ExampleMapping, name: str) -> None:
         """Save an example mapping to disk."""
@@ -87,4 +113,7 @@ class ExampleStore:
                 example_dir.rmdir()
             
             # Remove from list
-            self.examples.pop(index) 
\ No newline at end of file
+            self.examples.pop(index)
+            count = self._legal_text_counts.pop(example.legal_text) - 1
+            if count:
+                self._legal_text_counts[example.legal_text] = count 
\ No newline at end of file
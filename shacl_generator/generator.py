@@ -1,13 +1,22 @@
 from dataclasses import dataclass, field
 from typing import List, Dict, Optional, Tuple
 from pathlib import Path
+import hashlib
 import json
+import os
+import stat
+import tempfile
+from weakref import WeakKeyDictionary
 from rdflib import Graph, Namespace
 from rdflib.namespace import XSD, RDFS
 
 from .llm import LLMInterface
 from .datafields import DataFieldRegistry, DataField
 
+# The process umask, os.umask can only be read by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
 @dataclass
 class FeedbackHistory:
     text_id: str
@@ -19,6 +28,18 @@ class GeneratorContext:
     """Maintains the context of previous interactions and feedback."""
     feedback_history: List[FeedbackHistory] = field(default_factory=list)
     general_guidelines: List[str] = field(default_factory=list)
+    # Whether there are changes that have not been saved yet
+    dirty: bool = field(default=False, repr=False, compare=False)
+    # Positions in feedback_history for each text id
+    _feedback_index: Dict[str, List[int]] = field(default_factory=dict, init=False, repr=False, compare=False)
+    
+    def __post_init__(self) -> None:
+        self._rebuild_feedback_index()
+    
+    def _rebuild_feedback_index(self) -> None:
+        self._feedback_index = {}
+        for index, feedback in enumerate(self.feedback_history):
+            self._feedback_index.setdefault(feedback.text_id, []).append(index)
     
     def add_feedback(self, text_id: str, feedback: str, improved_shape: str) -> None:
         self.feedback_history.append(FeedbackHistory(
@@ -26,23 +47,36 @@ class GeneratorContext:
             feedback=feedback,
             improved_shape=improved_shape
         ))
+        self._feedback_index.setdefault(text_id, []).append(len(self.feedback_history) - 1)
+        self.dirty = True
+    
+    def feedback_indices(self, text_id: str) -> List[int]:
+        """Get the positions of all feedback items for a text id."""
+        return list(self._feedback_index.get(text_id, []))
     
     def add_guideline(self, guideline: str) -> None:
         """Add a general guideline that should apply to all future generations."""
         self.general_guidelines.append(guideline)
+        self.dirty = True
     
     def remove_guideline(self, index: int) -> None:
         """Remove a guideline by its index."""
         if 0 <= index < len(self.general_guidelines):
             del self.general_guidelines[index]
+            self.dirty = True
         
     def remove_feedback(self, index: int) -> None:
         """Remove a feedback item by its index."""
         if 0 <= index < len(self.feedback_history):
             del self.feedback_history[index]
+            # Positions after the removed item shift, so rebuild the index
+            self._rebuild_feedback_index()
+            self.dirty = True
         
     def save(self, path: Path) -> None:
-        """Save context to disk."""
+        """Save context to disk if it has changed."""
+        if not self.dirty and path.exists():
+            return
         data = {
             'feedback_history': [
                 {
@@ -54,8 +88,20 @@ class GeneratorContext:
             ],
             'general_guidelines': self.general_guidelines
         }
-        with open(path, 'w') as f:
-            json.dump(data, f, indent=2)
+        # Write to a temporary file next to the target and swap it in, so an
+        # interrupted save never leaves a truncated context behind
+        f = tempfile.NamedTemporaryFile('w', dir=path.parent, suffix='.tmp', delete=False)
+        try:
+            with f:
+                json.dump(data, f, indent=2)
+            # The temporary file is private (0600), give it the mode the context file would have
+            mode = stat.S_IMODE(path.stat().st_mode) if path.exists() else 0o666 & ~_UMASK
+            os.chmod(f.name, mode)
+            os.replace(f.name, path)
+        except Exception:
+            os.unlink(f.name)
+            raise
+        self.dirty = False
             
     @classmethod
     def load(cls, path: Path) -> 'GeneratorContext':
@@ -71,8 +117,21 @@ class GeneratorContext:
                 improved_shape=feedback['improved_shape']
             )
         context.general_guidelines.extend(data['general_guidelines'])
+        context.dirty = False
         return context
 
+# Turtle of shapes, examples and instances keyed by graph object. Graphs are
+# not modified once built, the stores replace a graph when its content changes,
+# and entries are dropped together with their graph.
+_turtle_cache: "WeakKeyDictionary[Graph, str]" = WeakKeyDictionary()
+
+def turtle_of(graph: Graph) -> str:
+    """Serialize a graph to Turtle, reusing the result for the same graph object."""
+    turtle = _turtle_cache.get(graph)
+    if turtle is None:
+        turtle = _turtle_cache[graph] = graph.serialize(format='turtle')
+    return turtle
+
 RULE_EXTRACTION_PROMPT = """Given the following legal text, extract the main rules and requirements in clear, human-readable sentences. Each rule should be concise and focus on a single requirement or constraint.
 
 Legal Text:
@@ -103,13 +162,13 @@ class ShaclGenerator:
             return []
             
         examples = []
-        for example in self.example_store.examples:
+        for example in self.example_store.examples[:max_examples]:  # TODO: Implement similarity-based selection
             examples.append({
                 "text": example.legal_text,
-                "shape": example.shacl_shape.serialize(format='turtle'),
+                "shape": turtle_of(example.shacl_shape),
                 "annotations": example.annotations
             })
-        return examples[:max_examples]  # TODO: Implement similarity-based selection
+        return examples
         
     def _get_relevant_feedback(self, text_id: str, max_items: int = 5) -> List[Dict]:
         """Get relevant feedback history for the generation context."""
@@ -122,8 +181,29 @@ class ShaclGenerator:
                 })
         return feedback_items[:max_items]  # TODO: Implement relevance-based selection
         
-    def generate_shape(self, legal_text: str, text_id: str) -> Tuple[Graph, List[DataField]]:
-        """Generate a SHACL shape from legal text."""
+    def create_generation_prompt(self, legal_text: str, text_id: str) -> str:
+        """Create the shape generation prompt with the examples, feedback and guidelines for a text."""
+        return self.llm._create_generation_prompt(
+            legal_text=legal_text,
+            examples=self._get_relevant_examples(text_id),
+            feedback_history=self._get_relevant_feedback(text_id),
+            guidelines=self.context.general_guidelines
+        )
+        
+    def context_digest(self, text_id: str) -> str:
+        """Digest of the examples, feedback and guidelines that go into the prompt for a text.
+        The data fields are left out, as generating a shape adds to them."""
+        context = {
+            "examples": self._get_relevant_examples(text_id),
+            "feedback": self._get_relevant_feedback(text_id),
+            "guidelines": self.context.general_guidelines
+        }
+        data = json.dumps(context, sort_keys=True, default=str)
+        return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+        
+    def generate_shape(self, legal_text: str, text_id: str, prompt: Optional[str] = None) -> Tuple[Graph, List[DataField]]:
+        """Generate a SHACL shape from legal text.
+        A prompt from create_generation_prompt is used as is instead of being built again."""
         # Initialize the graph with standard prefixes
         g = Graph()
         
@@ -134,25 +214,19 @@ class ShaclGenerator:
         g.bind('rdfs', RDFS)
         g.bind('rdf', self.RDF)
 
-        # Get examples and feedback for context
-        examples = self._get_relevant_examples(text_id)
-        feedback_history = self._get_relevant_feedback(text_id)
+        # Build the prompt with examples and feedback, unless the caller already did
+        if prompt is None:
+            prompt = self.create_generation_prompt(legal_text, text_id)
         
         # Generate the shape using LLM
-        generated_graph, new_fields = self.llm.generate_shape(
-            legal_text=legal_text,
-            examples=examples,
-            feedback_history=feedback_history,
-            guidelines=self.context.general_guidelines
-        )
+        generated_graph, new_fields = self.llm.generate_shape_from_prompt(prompt)
         
         # Merge the generated graph into our base graph
         g += generated_graph
         
         # Add any new fields to the registry
         if self.field_registry and new_fields:
-            for field in new_fields:
-                self.field_registry.add_field(field)
+            self.field_registry.add_fields(new_fields)
         
         return g, new_fields
     
@@ -164,8 +238,7 @@ class ShaclGenerator:
         
         # Add any new fields to the registry
         if self.field_registry and new_fields:
-            for field in new_fields:
-                self.field_registry.add_field(field)
+            self.field_registry.add_fields(new_fields)
         
         return improved_graph, new_fields
     
@@ -184,8 +257,7 @@ class ShaclGenerator:
         
         # Add any new fields to the registry
         if self.field_registry and new_fields:
-            for field in new_fields:
-                self.field_registry.add_field(field)
+            self.field_registry.add_fields(new_fields)
         
         return improved_graph, new_fields
         
@@ -8,12 +8,16 @@ from openai import OpenAI
 from dotenv import load_dotenv
 from rdflib import Graph, Namespace, URIRef
 import re
+import logging
 
 from .datafields import DataFieldRegistry, DataField
+from .debug_output import is_capturing
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 SHACL_GENERATION_SYSTEM_PROMPT = """
 Your task is to complete the SHACL shapes graph below from texts describing the eligibility requirements for a social benefit. The shapes graph will be used to validate RDF user graphs containing personal information, ensuring that only individuals eligible for the given benefit conform to the shapes graph.
 
@@ -229,8 +233,10 @@ Format rules as a numbered list, with one rule per line. Each rule should be:
 - Focused on a single requirement"""
 
 class LLMInterface:
-    def __init__(self, model: str = "gpt-4o", field_registry: Optional[DataFieldRegistry] = None):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, model: str = "gpt-4o", field_registry: Optional[DataFieldRegistry] = None, max_retries: int = 5):
+        # The client retries rate-limited (429) and server errors with exponential
+        # backoff, honouring the Retry-After header sent by the API
+        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=max_retries)
         self.model = model
         self.field_registry = field_registry
         
@@ -278,7 +284,14 @@ class LLMInterface:
                     f"Shape: {example['shape']}"
                 ])
         
-        # Add feedback history if available
+        # Add guidelines
+        if guidelines:
+            prompt_parts.append("\nAdditional guidelines:")
+            for guideline in guidelines:
+                prompt_parts.append(f"- {guideline}")
+        
+        # Everything above is the same for every legal text, so OpenAI can serve
+        # it from its prompt cache. Feedback depends on the text and comes after.
         if feedback_history:
             prompt_parts.append("\nPrevious feedback:")
             for item in feedback_history:
@@ -287,12 +300,6 @@ class LLMInterface:
                     f"Improved shape: {item['improved_shape']}"
                 ])
         
-        # Add guidelines
-        if guidelines:
-            prompt_parts.append("\nAdditional guidelines:")
-            for guideline in guidelines:
-                prompt_parts.append(f"- {guideline}")
-        
         # Add the legal text last
         prompt_parts.extend([
             "\nLegal text to convert:",
@@ -416,9 +423,7 @@ class LLMInterface:
         """Process LLM response and return a Graph and any new fields."""
         # Extract turtle content from response
         turtle_content = self._extract_turtle_content(response_text)
-        print("=== LLM OUTPUT ===")  # Use custom print
-        print(turtle_content)
-        print("================")
+        logger.info("=== LLM OUTPUT ===\n%s\n================", turtle_content)
         
         try:
             # Create graph and bind namespaces BEFORE parsing
@@ -429,17 +434,15 @@ class LLMInterface:
             g.bind('rdfs', "http://www.w3.org/2000/01/rdf-schema#")
             g.bind('rdf', "http://www.w3.org/1999/02/22-rdf-syntax-ns#")
             
-            print("=== BEFORE PARSING ===")
-            print("Namespaces:", list(g.namespaces()))
+            logger.debug("=== BEFORE PARSING ===\nNamespaces: %s", list(g.namespaces()))
             
             # Parse the content
             g.parse(data=turtle_content, format='turtle')
             
-            print("=== AFTER PARSING ===")
-            print("Namespaces:", list(g.namespaces()))
-            print("Graph content:")
-            print(g.serialize(format='turtle'))
-            print("==================")
+            logger.debug("=== AFTER PARSING ===\nNamespaces: %s", list(g.namespaces()))
+            # The package logger is always at DEBUG for the capture, so check for an active one
+            if is_capturing():
+                logger.debug("Graph content:\n%s\n==================", g.serialize(format='turtle'))
             
             # Extract any new fields
             new_fields = []
@@ -456,7 +459,7 @@ class LLMInterface:
             return g, new_fields
             
         except Exception as e:
-            print("=== Trying to fix ===")
+            logger.info("=== Trying to fix ===")
             # If parsing fails, try one more time with a fix request
             fix_prompt = f"""The following Turtle syntax is invalid. Please fix it to be valid Turtle/SHACL:
 
@@ -510,7 +513,10 @@ Output only the fixed Turtle syntax, no explanations."""
             feedback_history=feedback_history,
             guidelines=guidelines
         )
-        
+        return self.generate_shape_from_prompt(prompt)
+
+    def generate_shape_from_prompt(self, prompt: str) -> Tuple[Graph, List[DataField]]:
+        """Generate a SHACL shape from a prompt built with _create_generation_prompt."""
         response = self.client.chat.completions.create(
             model=self.model,
             messages=[
@@ -587,8 +593,7 @@ Output only the fixed Turtle syntax, no explanations."""
         )
         
         rules_text = response.choices[0].message.content
-        print("=== LLM OUTPUT ===")
-        print(rules_text)
+        logger.info("=== LLM OUTPUT ===\n%s", rules_text)
         
         return rules_text
     
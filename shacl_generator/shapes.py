@@ -13,6 +13,7 @@ class ShaclShape:
     created_at: datetime.datetime
     updated_at: datetime.datetime
     description: Optional[str] = None
+    context_digest: Optional[str] = None  # Digest of the examples, feedback and guidelines used
 
 class ShapeStore:
     def __init__(self, store_dir: Path):
@@ -21,7 +22,8 @@ class ShapeStore:
         self.shapes: Dict[str, ShaclShape] = {}
         self.load_all_shapes()
     
-    def add_shape(self, shape_id: str, legal_text: str, graph: Graph, description: Optional[str] = None) -> ShaclShape:
+    def add_shape(self, shape_id: str, legal_text: str, graph: Graph, description: Optional[str] = None,
+                  context_digest: Optional[str] = None) -> ShaclShape:
         """Add a new SHACL shape."""
         now = datetime.datetime.now()
         shape = ShaclShape(
@@ -30,7 +32,8 @@ class ShapeStore:
             graph=graph,
             created_at=now,
             updated_at=now,
-            description=description
+            description=description,
+            context_digest=context_digest
         )
         self.shapes[shape_id] = shape
         self._save_shape(shape)
@@ -77,7 +80,8 @@ class ShapeStore:
             'shape_id': shape.shape_id,
             'created_at': shape.created_at.isoformat(),
             'updated_at': shape.updated_at.isoformat(),
-            'description': shape.description
+            'description': shape.description,
+            'context_digest': shape.context_digest
         }
         with open(shape_dir / 'metadata.yaml', 'w') as f:
             yaml.dump(metadata, f)
@@ -114,7 +118,8 @@ class ShapeStore:
                     graph=g,
                     created_at=datetime.datetime.fromisoformat(metadata['created_at']),
                     updated_at=datetime.datetime.fromisoformat(metadata['updated_at']),
-                    description=metadata.get('description')
+                    description=metadata.get('description'),
+                    context_digest=metadata.get('context_digest')
                 )
                 self.shapes[shape.shape_id] = shape
             except Exception as e:
@@ -0,0 +1,30 @@
+import re
+from functools import lru_cache
+
+import tiktoken
+
+# The tokenizer never merges a run of line breaks with the non-whitespace
+# character that follows it, so token counts of blocks split there add up
+# to the token count of the whole text.
+TOKEN_BLOCK_BOUNDARY = re.compile(r"(?<=[\r\n])(?=\S)")
+
+@lru_cache(maxsize=None)
+def get_encoding() -> tiktoken.Encoding:
+    """Load the GPT tokenizer once per process."""
+    return tiktoken.get_encoding("cl100k_base")  # GPT-4 encoding
+
+# Module level, so the cache is shared by all sessions and survives reruns
+# of the Streamlit script
+@lru_cache(maxsize=4096)
+def count_block_tokens(block: str) -> int:
+    """Count the tokens of a single block of text."""
+    # Skips the special token scan, text like <|endoftext|> is counted as plain text instead of raising
+    return len(get_encoding().encode_ordinary(block))
+
+# Reruns ask for the same unchanged texts again, those are answered without
+# splitting them into blocks
+@lru_cache(maxsize=32)
+def count_tokens(text: str) -> int:
+    """Count the number of tokens in a text using GPT tokenizer.
+    An edited text only re-encodes the blocks that changed."""
+    return sum(count_block_tokens(block) for block in TOKEN_BLOCK_BOUNDARY.split(text))
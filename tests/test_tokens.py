@@ -0,0 +1,43 @@
+import pytest
+import tiktoken
+
+from shacl_generator.tokens import TOKEN_BLOCK_BOUNDARY, count_tokens, get_encoding
+
+# Pre-tokenizer pattern of cl100k_base, see tiktoken_ext/openai_public.py
+CL100K_PATTERN = r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+| ?[^\s\p{L}\p{N}]++[\r\n]*+|\s++$|\s*[\r\n]|\s+(?!\S)|\s"""
+
+# Merges around line breaks, including ones that span a block boundary,
+# so a wrong boundary shows up as a different count
+MERGES = [b"\r\n", b"\n\n", b"  ", b" \n", b".\n", b":\n", b"\nT", b"\n.", b"Th", b"The", b"he", b" t"]
+
+TEXTS = [
+    "The law\r\nThe rule\r\n\r\nThe end",
+    "Section 1.\nThe applicant:\n\nmust apply.\r\nTherefore, ok!\n\n(a) yes",
+    "  \n\nThe text starts with whitespace",
+    "The text ends with whitespace \n\n  ",
+    "\r\n\r\n  leading and trailing  \r\n",
+    "Line one.  \n  Line two. \n\n\n. dot\n'sentence\n<|endoftext|>\nend",
+    "",
+]
+
+def offline_encoding() -> tiktoken.Encoding:
+    ranks = {bytes([i]): i for i in range(256)}
+    for merge in MERGES:
+        ranks[merge] = len(ranks)
+    return tiktoken.Encoding(name="cl100k_offline", pat_str=CL100K_PATTERN, mergeable_ranks=ranks, special_tokens={})
+
+def block_sum(encoding: tiktoken.Encoding, text: str) -> int:
+    return sum(len(encoding.encode_ordinary(block)) for block in TOKEN_BLOCK_BOUNDARY.split(text))
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_block_counts_add_up(text):
+    encoding = offline_encoding()
+    assert block_sum(encoding, text) == len(encoding.encode_ordinary(text))
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_count_tokens_matches_whole_text(text):
+    try:
+        encoding = get_encoding()
+    except Exception as e:  # The vocabulary is downloaded on first use
+        pytest.skip(f"cl100k_base is not available: {e}")
+    assert count_tokens(text) == len(encoding.encode_ordinary(text))